@@ -1,12 +1,18 @@
 import robotic_warehouse_utils.data_collection as data_collection
 import importlib
+import inspect
 import logging
+import os
 import colorlog
 import pandas as pd
 import argparse
 import time
+import scripts.archive
+import scripts.capacity
 import scripts.install
+import scripts.metrics
 import scripts.plot
+import scripts.watchdog
 import matplotlib.pyplot as plt
 import numpy as np
 logger = logging.getLogger("Kex2019")
@@ -32,99 +38,141 @@ DEFAULT_PERIODICITY_UPPER = 700
 DEFAULT_STEPS = 4000
 DEFAULT_SEED = int(np.random.rand() * 3000)
 
+DATA_DIR = "data"
+""" Runs older than this are packed into data/archive after every sweep. """
+RETENTION = 14 * 24 * 60 * 60
+WATCHDOG_LIMITS = scripts.watchdog.limits(
+    wall=2 * 60 * 60, cpu=2 * 60 * 60, memory=4 * 1024**3, stall=5 * 60)
+""" Set while listing what a strategy evaluates, supervised_evaluate then records its arguments instead of running them. """
+EVALUATIONS = None
 
-def rprd_eval(name: str, module: "f: eval") -> None:
-    timestamp = time.time()
+CAPACITY_REPLICATES = 3
+""" Relative spread of the spawn periodicity kept while the capacity search moves its mean. """
+PERIODICITY_WINDOW = (DEFAULT_PERIODICITY_UPPER - DEFAULT_PERIODICITY_LOWER
+                      ) / (DEFAULT_PERIODICITY_UPPER + DEFAULT_PERIODICITY_LOWER)
+
+
+def _evaluate(module_name: str, kwargs: dict) -> None:
+    """ Runs in the supervised child process, which imports the strategy itself.
+
+    A strategy whose evaluate takes a metrics argument gets a metric log
+    for the run, data/<name>.metrics. A log left empty is removed so the
+    readers fall back to the csvs. """
+    module = importlib.import_module(module_name)
+    if "metrics" not in inspect.signature(module.evaluate).parameters:
+        try:
+            module.evaluate(**kwargs)
+        except data_collection.EvaluationDone:
+            pass
+        return
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = "{}/{}{}".format(DATA_DIR, kwargs["name"], scripts.metrics.SUFFIX)
+    log = scripts.metrics.metric_log(path, dict(kwargs, strategy=module_name))
     try:
-        module.evaluate(
-            render=RENDER,
-            robots=DEFAULT_ROBOTS,
-            spawn=DEFAULT_SPAWN,
-            shelve_length=DEFAULT_SHELVE_LENGTH,
-            shelve_width=DEFAULT_SHELVE_WIDTH,
-            shelve_height=DEFAULT_SHELVE_HEIGHT,
-            periodicity_lower=DEFAULT_PERIODICITY_LOWER,
-            periodicity_upper=DEFAULT_PERIODICITY_UPPER,
-            steps=DEFAULT_STEPS,
-            seed=DEFAULT_SEED,
-            name="rprd")
+        module.evaluate(metrics=log, **kwargs)
     except data_collection.EvaluationDone:
-        logger.info("Duration {} seconds".format(time.time() - timestamp))
+        pass
+    finally:
+        log.close()
+        if log.count == 0:
+            os.remove(path)
+
+
+def _supervise(module: "f: eval", kwargs: dict,
+               check: "f: () -> str" = None) -> scripts.watchdog.result:
+    outcome = scripts.watchdog.supervise(logger, kwargs["name"], _evaluate,
+                                         (module.__name__, kwargs),
+                                         WATCHDOG_LIMITS, check, DATA_DIR)
+    scripts.watchdog.record(DATA_DIR, outcome)
+    return outcome
+
+
+def supervised_evaluate(module: "f: eval", **kwargs) -> bool:
+    if EVALUATIONS is not None:
+        EVALUATIONS.append(kwargs)
+        return True
+
+    return not _supervise(module, kwargs).failed
+
+
+def rprd_eval(name: str, module: "f: eval") -> None:
+    supervised_evaluate(
+        module,
+        render=RENDER,
+        robots=DEFAULT_ROBOTS,
+        spawn=DEFAULT_SPAWN,
+        shelve_length=DEFAULT_SHELVE_LENGTH,
+        shelve_width=DEFAULT_SHELVE_WIDTH,
+        shelve_height=DEFAULT_SHELVE_HEIGHT,
+        periodicity_lower=DEFAULT_PERIODICITY_LOWER,
+        periodicity_upper=DEFAULT_PERIODICITY_UPPER,
+        steps=DEFAULT_STEPS,
+        seed=DEFAULT_SEED,
+        name="rprd")
 
 
 def cwcw_eval(name: str, module: "f: eval") -> None:
-    timestamp = time.time()
-    try:
-        module.evaluate(
-            render=RENDER,
-            robots=DEFAULT_ROBOTS,
-            spawn=DEFAULT_SPAWN,
-            shelve_length=DEFAULT_SHELVE_LENGTH,
-            shelve_width=DEFAULT_SHELVE_WIDTH,
-            shelve_height=DEFAULT_SHELVE_HEIGHT,
-            periodicity_lower=DEFAULT_PERIODICITY_LOWER,
-            periodicity_upper=DEFAULT_PERIODICITY_UPPER,
-            steps=DEFAULT_STEPS,
-            seed=DEFAULT_SEED,
-            name="cgw")
-    except data_collection.EvaluationDone:
-        logger.info("Duration {} seconds".format(time.time() - timestamp))
+    supervised_evaluate(
+        module,
+        render=RENDER,
+        robots=DEFAULT_ROBOTS,
+        spawn=DEFAULT_SPAWN,
+        shelve_length=DEFAULT_SHELVE_LENGTH,
+        shelve_width=DEFAULT_SHELVE_WIDTH,
+        shelve_height=DEFAULT_SHELVE_HEIGHT,
+        periodicity_lower=DEFAULT_PERIODICITY_LOWER,
+        periodicity_upper=DEFAULT_PERIODICITY_UPPER,
+        steps=DEFAULT_STEPS,
+        seed=DEFAULT_SEED,
+        name="cgw")
 
 
 def sh_eval(name, module: "f: eval") -> None:
-    timestamp = time.time()
-    try:
-        module.evaluate(
-            render=RENDER,
-            robots=DEFAULT_ROBOTS,
-            spawn=DEFAULT_SPAWN,
-            shelve_length=DEFAULT_SHELVE_LENGTH,
-            shelve_width=DEFAULT_SHELVE_WIDTH,
-            shelve_height=DEFAULT_SHELVE_HEIGHT,
-            periodicity_lower=DEFAULT_PERIODICITY_LOWER,
-            periodicity_upper=DEFAULT_PERIODICITY_UPPER,
-            steps=DEFAULT_STEPS,
-            seed=DEFAULT_SEED,
-            name="center")
-    except data_collection.EvaluationDone:
-        logger.info("Duration {} seconds".format(time.time() - timestamp))
+    supervised_evaluate(
+        module,
+        render=RENDER,
+        robots=DEFAULT_ROBOTS,
+        spawn=DEFAULT_SPAWN,
+        shelve_length=DEFAULT_SHELVE_LENGTH,
+        shelve_width=DEFAULT_SHELVE_WIDTH,
+        shelve_height=DEFAULT_SHELVE_HEIGHT,
+        periodicity_lower=DEFAULT_PERIODICITY_LOWER,
+        periodicity_upper=DEFAULT_PERIODICITY_UPPER,
+        steps=DEFAULT_STEPS,
+        seed=DEFAULT_SEED,
+        name="center")
 
-    timestamp = time.time()
-    try:
-        module.evaluate(
-            render=RENDER,
-            robots=DEFAULT_ROBOTS,
-            spawn=DEFAULT_SPAWN,
-            shelve_length=DEFAULT_SHELVE_LENGTH,
-            shelve_width=DEFAULT_SHELVE_WIDTH,
-            shelve_height=DEFAULT_SHELVE_HEIGHT,
-            periodicity_lower=DEFAULT_PERIODICITY_LOWER,
-            periodicity_upper=DEFAULT_PERIODICITY_UPPER,
-            steps=DEFAULT_STEPS,
-            even=True,
-            seed=DEFAULT_SEED,
-            name="even")
-    except data_collection.EvaluationDone:
-        logger.info("Duration {} seconds".format(time.time() - timestamp))
+    supervised_evaluate(
+        module,
+        render=RENDER,
+        robots=DEFAULT_ROBOTS,
+        spawn=DEFAULT_SPAWN,
+        shelve_length=DEFAULT_SHELVE_LENGTH,
+        shelve_width=DEFAULT_SHELVE_WIDTH,
+        shelve_height=DEFAULT_SHELVE_HEIGHT,
+        periodicity_lower=DEFAULT_PERIODICITY_LOWER,
+        periodicity_upper=DEFAULT_PERIODICITY_UPPER,
+        steps=DEFAULT_STEPS,
+        even=True,
+        seed=DEFAULT_SEED,
+        name="even")
 
 
 def pfe_eval(name, module: "f: eval") -> None:
-    timestamp = time.time()
-    try:
-        module.evaluate(
-            render=RENDER,
-            robots=DEFAULT_ROBOTS,
-            spawn=DEFAULT_SPAWN,
-            shelve_length=DEFAULT_SHELVE_LENGTH,
-            shelve_width=DEFAULT_SHELVE_WIDTH,
-            shelve_height=DEFAULT_SHELVE_HEIGHT,
-            periodicity_lower=DEFAULT_PERIODICITY_LOWER,
-            periodicity_upper=DEFAULT_PERIODICITY_UPPER,
-            steps=DEFAULT_STEPS,
-            seed=DEFAULT_SEED,
-            name="pfe")
-    except data_collection.EvaluationDone:
-        logger.info("Duration {} seconds".format(time.time() - timestamp))
+    supervised_evaluate(
+        module,
+        render=RENDER,
+        robots=DEFAULT_ROBOTS,
+        spawn=DEFAULT_SPAWN,
+        shelve_length=DEFAULT_SHELVE_LENGTH,
+        shelve_width=DEFAULT_SHELVE_WIDTH,
+        shelve_height=DEFAULT_SHELVE_HEIGHT,
+        periodicity_lower=DEFAULT_PERIODICITY_LOWER,
+        periodicity_upper=DEFAULT_PERIODICITY_UPPER,
+        steps=DEFAULT_STEPS,
+        seed=DEFAULT_SEED,
+        name="pfe")
 
 
 STRATEGIES = {
@@ -150,6 +198,82 @@ def eval_strategies() -> None:
                 index, name, module_name))
 
     logger.info("Evaulation Done")
+    scripts.archive.retain(logger, DATA_DIR, RETENTION)
+
+
+def _evaluations(name: str, module: "f: eval", E: "f: eval") -> [dict]:
+    """ The arguments of every evaluation E runs, without running them. """
+    global EVALUATIONS
+    EVALUATIONS = []
+    try:
+        E(name, module)
+        return EVALUATIONS
+    finally:
+        EVALUATIONS = None
+
+
+def _capacity_probe(module: "f: eval", kwargs: dict, destination: str,
+                    rate: float) -> (float, [str]):
+    """ Runs the evaluation CAPACITY_REPLICATES times with the periodicity closest to rate.
+
+    Returns the rate that periodicity gives along with the verdict of each
+    run. Every replicate is collected before the next one starts, they
+    share a name and would otherwise overwrite each other's files. """
+    lower, upper = scripts.capacity.periodicity(kwargs["spawn"], rate,
+                                                PERIODICITY_WINDOW)
+    simulated = scripts.capacity.rate(kwargs["spawn"], lower, upper)
+    """ The last spawn may still be in flight when the run ends. """
+    expected = max(0, kwargs["steps"] * simulated - kwargs["spawn"])
+
+    reasons = []
+    for replicate in range(CAPACITY_REPLICATES):
+        since = time.time()
+        outcome = _supervise(
+            module,
+            dict(
+                kwargs,
+                periodicity_lower=lower,
+                periodicity_upper=upper,
+                seed=kwargs["seed"] + replicate),
+            scripts.capacity.monitor(DATA_DIR, since))
+        latencies = scripts.capacity.collect(
+            logger, DATA_DIR, since, "{}/{:.5f}/{}".format(
+                destination, simulated, replicate))
+        reasons.append(scripts.capacity.judge(outcome, latencies, expected))
+
+    return simulated, reasons
+
+
+def capacity_search() -> None:
+    """ Finds the highest package arrival rate each evaluation of each strategy sustains. """
+    logger.info("Searching Capacity")
+    start = scripts.capacity.rate(DEFAULT_SPAWN, DEFAULT_PERIODICITY_LOWER,
+                                  DEFAULT_PERIODICITY_UPPER)
+    estimates = []
+    for index, (name, (module_name, E)) in enumerate(STRATEGIES.items()):
+        module_spec = importlib.util.find_spec(module_name)
+        if module_spec:
+            logger.info("Strategy {} - {}".format(index, name))
+            module = importlib.import_module(module_name)
+            for kwargs in _evaluations(name, module, E):
+                variant = "{}/{}".format(name, kwargs["name"])
+                destination = "{}/{}/{}".format(
+                    DATA_DIR, scripts.capacity.CAPACITY_DIR, variant)
+                estimates.append(
+                    scripts.capacity.search(
+                        logger, variant,
+                        lambda rate: _capacity_probe(
+                            module, kwargs, destination, rate),
+                        start, DATA_DIR))
+        else:
+            logger.error("Strategy {} - {} Cannot find Module {}".format(
+                index, name, module_name))
+
+    for estimate in estimates:
+        logger.info(str(estimate))
+
+    logger.info("Capacity Search Done")
+    scripts.archive.retain(logger, DATA_DIR, RETENTION)
 
 
 def make_plots() -> None:
@@ -165,9 +289,21 @@ if __name__ == "__main__":
         help="Install everything -- submodules -- deps -- the whole bunch",
         action="store_true")
     parser.add_argument("--user", help="Install in user", action="store_true")
+    parser.add_argument(
+        "--archive",
+        help="Archive all runs in the data directory now",
+        action="store_true")
+    parser.add_argument(
+        "--capacity",
+        help="Search the highest arrival rate each strategy sustains",
+        action="store_true")
     parser.add_argument("--show", help="Show plots", action="store_true")
 
     parser.add_argument("--plot", help="Create plots", action="store_true")
+    parser.add_argument(
+        "--force",
+        help="Rebuild all plots even if their inputs did not change",
+        action="store_true")
     args = parser.parse_args()
 
     if args.install:
@@ -176,8 +312,14 @@ if __name__ == "__main__":
     if args.evaluate:
         eval_strategies()
 
+    if args.capacity:
+        capacity_search()
+
+    if args.archive:
+        scripts.archive.retain(logger, DATA_DIR, 0)
+
     if args.plot:
-        scripts.plot.plot(logger)
+        scripts.plot.plot(logger, args.force)
 
     if args.show:
         plt.show()
@@ -0,0 +1,271 @@
+import builtins
+import hashlib
+import io
+import json
+import os
+import struct
+import time
+import zstandard
+import scripts.watchdog
+
+MAGIC = b"KEXARCH1"
+""" index offset, index length, magic -- the last bytes of every archive. """
+FOOTER = struct.Struct("<QQ8s")
+SUFFIX = ".kexa"
+ARCHIVE_DIR = "archive"
+""" archive path SEPARATOR member name addresses a file inside an archive. """
+SEPARATOR = "::"
+CHUNK_SIZE = 4 << 20
+LEVEL = 10
+""" Files that are still being appended to are never archived. """
+KEEP = [scripts.watchdog.RECORD_FILE]
+
+_indexes = {}
+
+
+class ArchiveException(Exception):
+    def __init__(self, cause):
+        self.cause = cause
+
+    def __str__(self):
+        return "Archive Exception: {}".format(self.cause)
+
+
+def _index(path: str) -> dict:
+    """ Member name -> size, mtime, sha1 and the (offset, compressed, size) of every chunk. """
+    mtime = os.path.getmtime(path)
+    if path in _indexes and _indexes[path][0] == mtime:
+        return _indexes[path][1]
+
+    with builtins.open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ArchiveException("{} is not an archive".format(path))
+
+        f.seek(-FOOTER.size, os.SEEK_END)
+        offset, length, magic = FOOTER.unpack(f.read(FOOTER.size))
+        if magic != MAGIC:
+            raise ArchiveException("{} has no index -- truncated?".format(path))
+
+        f.seek(offset)
+        index = json.loads(f.read(length).decode())
+
+    _indexes[path] = (mtime, index)
+    return index
+
+
+class _member(io.RawIOBase):
+    """ Decompresses a member one chunk at a time, the rest of the archive is never touched. """
+
+    def __init__(self, path: str, chunks: [[int]]):
+        self.file = builtins.open(path, "rb")
+        self.chunks = chunks
+        self.next = 0
+        self.buffer = memoryview(b"")
+        self.decompressor = zstandard.ZstdDecompressor()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not len(self.buffer) and self.next < len(self.chunks):
+            offset, compressed, size = self.chunks[self.next]
+            self.next += 1
+            self.file.seek(offset)
+            try:
+                self.buffer = memoryview(
+                    self.decompressor.decompress(
+                        self.file.read(compressed), max_output_size=size))
+            except zstandard.ZstdError as e:
+                raise ArchiveException(
+                    "{} has a damaged chunk at {} -- {}".format(
+                        self.file.name, offset, e))
+
+        n = min(len(b), len(self.buffer))
+        b[:n] = self.buffer[:n]
+        self.buffer = self.buffer[n:]
+        return n
+
+    def close(self) -> None:
+        self.file.close()
+        super().close()
+
+
+def split(path: str) -> (str, str):
+    """ Archive and member of an archived path, (path, None) for a plain file. """
+    if SEPARATOR in path:
+        container, member = path.split(SEPARATOR, 1)
+        return container, member
+    return path, None
+
+
+def container(path: str) -> str:
+    """ The file on disk that holds path. """
+    return split(path)[0]
+
+
+def open_file(path: str) -> "binary file":
+    container, member = split(path)
+    if member is None:
+        return builtins.open(path, "rb")
+
+    index = _index(container)
+    if member not in index:
+        raise ArchiveException("{} has no member {}".format(container, member))
+
+    return io.BufferedReader(
+        _member(container, index[member]["chunks"]), buffer_size=CHUNK_SIZE)
+
+
+def read(path: str) -> bytes:
+    with open_file(path) as f:
+        return f.read()
+
+
+def archives(data_dir: str) -> [str]:
+    directory = "{}/{}".format(data_dir, ARCHIVE_DIR)
+    if not os.path.isdir(directory):
+        return []
+
+    return sorted([
+        "{}/{}".format(directory, f) for f in os.listdir(directory)
+        if f.endswith(SUFFIX)
+    ])
+
+
+def listdir(data_dir: str, logger=None) -> dict:
+    """ File name -> path for every run in data_dir, archived or not.
+
+    Later archives shadow earlier ones and plain files shadow all of them.
+    An archive whose index does not read is skipped. """
+    files = {}
+    for path in archives(data_dir):
+        try:
+            index = _index(path)
+        except (ArchiveException, OSError, ValueError) as e:
+            if logger is not None:
+                logger.error("Skipping archive {} -- REASON: {}".format(
+                    path, e))
+            continue
+
+        for member in index:
+            files[member] = "{}{}{}".format(path, SEPARATOR, member)
+
+    for f in os.listdir(data_dir):
+        if os.path.isfile("{}/{}".format(data_dir, f)):
+            files[f] = "{}/{}".format(data_dir, f)
+
+    return files
+
+
+def _name() -> str:
+    """ Sorts by creation time, the microseconds and pid keep passes that start in the same second apart. """
+    now = time.time()
+    return "{}.{:06d}-{}".format(
+        time.strftime("%Y%m%d-%H%M%S", time.localtime(now)),
+        int(now % 1 * 1000000), os.getpid())
+
+
+def _place(partial: str, directory: str, name: str) -> str:
+    """ Links partial in under the first free name, an existing archive is never replaced. """
+    attempt = 0
+    while True:
+        path = "{}/{}-{}{}".format(directory, name, attempt, SUFFIX)
+        try:
+            os.link(partial, path)
+        except FileExistsError:
+            attempt += 1
+            continue
+
+        os.remove(partial)
+        return path
+
+
+def write(directory: str, sources: [str]) -> (str, dict):
+    """ Packs sources into a new archive in directory, written aside and linked in place once complete. """
+    compressor = zstandard.ZstdCompressor(level=LEVEL)
+    index = {}
+    name = _name()
+    partial = "{}/{}{}.partial".format(directory, name, SUFFIX)
+    with builtins.open(partial, "xb") as out:
+        out.write(MAGIC)
+        for source in sources:
+            sha = hashlib.sha1()
+            chunks = []
+            with builtins.open(source, "rb") as f:
+                for data in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    sha.update(data)
+                    compressed = compressor.compress(data)
+                    chunks.append([out.tell(), len(compressed), len(data)])
+                    out.write(compressed)
+
+            stat = os.stat(source)
+            index[os.path.basename(source)] = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "sha1": sha.hexdigest(),
+                "chunks": chunks
+            }
+
+        blob = json.dumps(index).encode()
+        offset = out.tell()
+        out.write(blob)
+        out.write(FOOTER.pack(offset, len(blob), MAGIC))
+        out.flush()
+        os.fsync(out.fileno())
+
+    return _place(partial, directory, name), index
+
+
+def _verify(path: str, index: dict) -> bool:
+    for member, entry in index.items():
+        sha = hashlib.sha1()
+        try:
+            with open_file("{}{}{}".format(path, SEPARATOR, member)) as f:
+                for data in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    sha.update(data)
+        except ArchiveException:
+            return False
+
+        if sha.hexdigest() != entry["sha1"]:
+            return False
+
+    return True
+
+
+def retain(logger, data_dir: str, age: float) -> str:
+    """ Moves every run in data_dir older than age seconds into a new archive. """
+    if not os.path.isdir(data_dir):
+        logger.error("{} is not a directory".format(data_dir))
+        return None
+
+    cutoff = time.time() - age
+    sources = []
+    for f in sorted(os.listdir(data_dir)):
+        path = "{}/{}".format(data_dir, f)
+        if f in KEEP or not os.path.isfile(path):
+            continue
+        if os.path.getmtime(path) < cutoff:
+            sources.append(path)
+
+    if not sources:
+        logger.info("Nothing in {} older than {} days to archive".format(
+            data_dir, age / (24 * 60 * 60)))
+        return None
+
+    directory = "{}/{}".format(data_dir, ARCHIVE_DIR)
+    os.makedirs(directory, exist_ok=True)
+
+    logger.info("Archiving {} files into {}".format(len(sources), directory))
+    path, index = write(directory, sources)
+    if not _verify(path, index):
+        logger.error("{} does not read back -- keeping the files".format(path))
+        return None
+
+    size = sum([os.path.getsize(source) for source in sources])
+    for source in sources:
+        os.remove(source)
+
+    logger.info("Archived {:.1f} MiB into {:.1f} MiB".format(
+        size / (1 << 20),
+        os.path.getsize(path) / (1 << 20)))
+    return path
@@ -0,0 +1,290 @@
+import math
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+import scripts.metrics
+import scripts.watchdog
+
+LATENCY = "latency"
+CAPACITY_DIR = "capacity"
+RESULT_FILE = "capacity.csv"
+
+""" A run is unstable when the latency of its last third is this many times that of its first third. """
+GROWTH = 2.0
+MIN_SAMPLES = 30
+""" A run that delivers less than this share of the packages it should have spawned is unstable. """
+DELIVERED = 0.8
+""" Two-sided 95% normal quantile for the interval on the stable share of a rate. """
+Z = 1.96
+""" Bisection stops once upper / lower is within this. """
+TOLERANCE = 0.05
+MAX_PROBES = 24
+
+
+def wilson(stables: int, runs: int) -> (float, float):
+    """ Wilson score interval of the share of runs that are stable, (0, 1) without runs. """
+    if runs == 0:
+        return 0.0, 1.0
+
+    share = stables / runs
+    denominator = 1 + Z * Z / runs
+    center = (share + Z * Z / (2 * runs)) / denominator
+    spread = Z * math.sqrt(share * (1 - share) / runs + Z * Z /
+                           (4 * runs * runs)) / denominator
+    return max(0.0, center - spread), min(1.0, center + spread)
+
+
+class estimate():
+    """ Saturation point of a strategy in packages per step.
+
+    lower is the highest rate found stable, upper the lowest found unstable,
+    so the saturation point lies in between. That is the resolution of the
+    search, not a confidence interval -- each rate was decided by a majority
+    of a few runs, counts holds the (stable, runs) behind lower and upper
+    and interval the Wilson interval on their stable share. lower or upper
+    is None if the search did not bracket the saturation point. """
+
+    def __init__(self, name: str, lower: float, upper: float, probes: int,
+                 counts: dict):
+        self.name = name
+        self.lower = lower
+        self.upper = upper
+        self.probes = probes
+        self.counts = counts
+
+    def interval(self, rate: float) -> (float, float):
+        if rate not in self.counts:
+            return 0.0, 1.0
+        return wilson(*self.counts[rate])
+
+    @property
+    def rate(self) -> float:
+        """ None when no rate was stable, lower when no rate was unstable. """
+        if self.lower is None or self.upper is None:
+            return self.lower
+        return math.sqrt(self.lower * self.upper)
+
+    def _share(self, rate: float) -> str:
+        if rate not in self.counts:
+            return "-"
+        return "{}/{} stable, 95% [{:.2f}, {:.2f}]".format(
+            *self.counts[rate], *self.interval(rate))
+
+    def __str__(self):
+        return "{} saturates at {} packages/step -- bracket [{}, {}] after {} probes -- {} at lower, {} at upper".format(
+            self.name, self.rate, self.lower, self.upper, self.probes,
+            self._share(self.lower), self._share(self.upper))
+
+
+def periodicity(spawn: int, rate: float, window: float) -> (int, int):
+    """ Spawn periodicity bounds that give rate packages per step on average.
+
+    The bounds are whole steps of at least one, so the rate they give --
+    rate(spawn, lower, upper) -- is only close to the one asked for and
+    stops growing once both are clamped to one. """
+    mean = spawn / rate
+    return max(1, int(round(mean * (1 - window)))), max(
+        1, int(round(mean * (1 + window))))
+
+
+def rate(spawn: int, lower: int, upper: int) -> float:
+    return spawn / ((lower + upper) / 2)
+
+
+def unstable(latencies: np.ndarray) -> str:
+    """ Returns why the run looks unstable or an empty string. """
+    if len(latencies) < MIN_SAMPLES:
+        return "Only {} packages delivered".format(len(latencies))
+
+    third = len(latencies) // 3
+    head = np.nanmean(latencies[:third])
+    tail = np.nanmean(latencies[-third:])
+    if tail > GROWTH * max(head, 1.0):
+        return "Latency grew from {:.1f} to {:.1f}".format(head, tail)
+
+    return ""
+
+
+def _new_files(data_dir: str, since: float) -> [str]:
+    return [
+        "{}/{}".format(data_dir, f) for f in os.listdir(data_dir)
+        if f != scripts.watchdog.RECORD_FILE
+        and os.path.isfile("{}/{}".format(data_dir, f))
+        and os.path.getmtime("{}/{}".format(data_dir, f)) >= since
+    ]
+
+
+def _latencies(path: str) -> np.ndarray:
+    if path.endswith(scripts.metrics.SUFFIX):
+        records, _ = scripts.metrics.read(path)
+        return records["latency"][records["event"] == scripts.metrics.DROP]
+
+    if LATENCY in os.path.basename(path):
+        try:
+            return pd.read_csv(path)[LATENCY].values
+        except (pd.errors.EmptyDataError, KeyError):
+            return None
+
+    return None
+
+
+def _latency_source(paths: [str]) -> str:
+    """ One source per run, the metric log when there is one and the latency csv otherwise. """
+    logs = [p for p in paths if p.endswith(scripts.metrics.SUFFIX)]
+    if logs:
+        return max(logs, key=os.path.getmtime)
+
+    csvs = [p for p in paths if LATENCY in os.path.basename(p)]
+    if csvs:
+        return max(csvs, key=os.path.getmtime)
+
+    return None
+
+
+def monitor(data_dir: str, since: float) -> "f: () -> str":
+    """ Watchdog check that stops a run early once its live latencies look unstable.
+
+    The latency csv is read while it is being written, a torn last line or
+    rows still sitting in the writer's buffer only make the check late. """
+
+    def check() -> str:
+        path = _latency_source(_new_files(data_dir, since))
+        if path is None:
+            return ""
+
+        try:
+            latencies = _latencies(path)
+        except (scripts.metrics.MetricLogException, pd.errors.ParserError,
+                ValueError):
+            return ""
+
+        """ Too few deliveries yet is no verdict, the run has only just started. """
+        if latencies is None or len(latencies) < MIN_SAMPLES:
+            return ""
+        return unstable(latencies)
+
+    return check
+
+
+def collect(logger, data_dir: str, since: float,
+            destination: str) -> np.ndarray:
+    """ Latencies of the run written since `since`, None if it left none.
+
+    The files are moved out of the data directory so probes never end up
+    in the plots -- and so the next run with the same name starts clean. """
+    os.makedirs(destination, exist_ok=True)
+
+    paths = _new_files(data_dir, since)
+    path = _latency_source(paths)
+    latencies = None
+    if path is not None:
+        try:
+            latencies = _latencies(path)
+        except (scripts.metrics.MetricLogException, pd.errors.ParserError,
+                ValueError) as e:
+            logger.error("Unable to read {} -- REASON: {}".format(path, e))
+
+    for path in paths:
+        shutil.move(path, "{}/{}".format(destination,
+                                         os.path.basename(path)))
+
+    return None if latencies is None else np.asarray(latencies)
+
+
+def judge(outcome: scripts.watchdog.result, latencies: np.ndarray,
+          expected: float) -> str:
+    """ Why a run counts against its rate, an empty string if it does not.
+
+    expected is how many packages the run should have delivered had it
+    kept up with the arrivals. """
+    if outcome.failed:
+        return "{} {}".format(
+            outcome.status,
+            outcome.reason.strip().splitlines()[0] if outcome.reason else "")
+
+    if latencies is None:
+        return "No latency data"
+
+    if len(latencies) < DELIVERED * expected:
+        return "Delivered {} of {:.0f} packages".format(
+            len(latencies), expected)
+
+    return unstable(latencies)
+
+
+def _record(data_dir: str, name: str, probe_rate: float, stable: bool,
+            stables: int, runs: int, reason: str) -> None:
+    path = "{}/{}/{}".format(data_dir, CAPACITY_DIR, RESULT_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    exists = os.path.isfile(path)
+    low, high = wilson(stables, runs)
+    with open(path, "a") as f:
+        if not exists:
+            f.write("timestamp,name,rate,stable,stables,runs,low,high,reason\n")
+        f.write("{},{},{},{},{},{},{:.3f},{:.3f},\"{}\"\n".format(
+            time.time(), name, probe_rate, stable, stables, runs, low, high,
+            reason.replace("\"", "'")))
+
+
+def search(logger, name: str, probe: "f: (float) -> (float, [str])",
+           start: float, data_dir: str) -> estimate:
+    """ Bracket the saturation rate by doubling / halving from start, then bisect it geometrically.
+
+    probe(rate) runs evaluations as close to rate as the spawn periodicity
+    allows and returns the rate it simulated along with the judge verdict
+    of every run. A rate is stable when most of its runs are. The search
+    stops early once the simulated rate no longer moves. """
+    lower, upper = None, None
+    probes = 0
+    counts = {}
+
+    def stable(probe_rate: float) -> (float, bool):
+        simulated, reasons = probe(probe_rate)
+        unstables = [r for r in reasons if r]
+        stables = len(reasons) - len(unstables)
+        verdict = stables > len(unstables)
+        reason = " | ".join(unstables)
+        counts[simulated] = (stables, len(reasons))
+
+        logger.info("Capacity {} -- rate {:.5f} -- {}/{} stable -- {}".format(
+            name, simulated, stables, len(reasons),
+            "stable" if verdict else "unstable " + reason))
+        _record(data_dir, name, simulated, verdict, stables, len(reasons),
+                reason)
+        return simulated, verdict
+
+    probe_rate = start
+    while probes < MAX_PROBES and (lower is None or upper is None):
+        probes += 1
+        simulated, verdict = stable(probe_rate)
+        if verdict and lower is not None and simulated <= lower:
+            logger.warning(
+                "Capacity {} -- {:.5f} is the highest rate the spawn periodicity can give".
+                format(name, lower))
+            break
+        elif verdict:
+            lower = simulated
+            probe_rate = simulated * 2
+        else:
+            upper = simulated
+            probe_rate = simulated / 2
+
+    bracketed = lower is not None and upper is not None
+    while bracketed and probes < MAX_PROBES and upper / lower > 1 + TOLERANCE:
+        probes += 1
+        simulated, verdict = stable(math.sqrt(lower * upper))
+        if not lower < simulated < upper:
+            logger.info(
+                "Capacity {} -- the spawn periodicity cannot resolve [{:.5f}, {:.5f}] any further".
+                format(name, lower, upper))
+            break
+        elif verdict:
+            lower = simulated
+        else:
+            upper = simulated
+
+    result = estimate(name, lower, upper, probes, counts)
+    logger.info(str(result))
+    return result
@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+import scripts.archive
+import scripts.metrics
+
+COLLISION = "collision"
+""" Columns of the collision tables, x / y are grid cells and step the simulation step.
+
+The tables are written by the data collection in the utilities submodule,
+which is not part of this tree. These are the names it is expected to use,
+[collision] in plot.conf maps them when it writes others. """
+X = "x"
+Y = "y"
+STEP = "step"
+COLUMNS = (X, Y, STEP)
+CHUNK_ROWS = 1 << 20
+TIME_BUCKET = 100
+HOTSPOTS = 10
+
+
+class heatmap():
+    """ Collision counts per grid cell and per TIME_BUCKET steps.
+
+    Cells are integers so binning is a bincount over the flattened index,
+    the grid grows as larger coordinates show up so the extent does not
+    have to be known up front. """
+
+    def __init__(self, name: str, bucket: int = TIME_BUCKET):
+        self.name = name
+        self.bucket = bucket
+        self.grid = np.zeros((0, 0), dtype=np.int64)
+        self.timeline = np.zeros(0, dtype=np.int64)
+        self.events = 0
+        self.dropped = 0
+        """ Sources that read without error. """
+        self.read = 0
+
+    def _grow(self, height: int, width: int) -> None:
+        if height <= self.grid.shape[0] and width <= self.grid.shape[1]:
+            return
+
+        grid = np.zeros((max(height, self.grid.shape[0]),
+                         max(width, self.grid.shape[1])),
+                        dtype=np.int64)
+        grid[:self.grid.shape[0], :self.grid.shape[1]] = self.grid
+        self.grid = grid
+
+    def add(self, x: np.ndarray, y: np.ndarray, step: np.ndarray) -> None:
+        valid = np.isfinite(x) & np.isfinite(y) & (x >= 0) & (y >= 0)
+        self.dropped += len(valid) - np.count_nonzero(valid)
+
+        xs = x[valid].astype(np.int64)
+        ys = y[valid].astype(np.int64)
+        if len(xs):
+            self._grow(ys.max() + 1, xs.max() + 1)
+            height, width = self.grid.shape
+            self.grid += np.bincount(
+                ys * width + xs, minlength=height * width).reshape(
+                    height, width)
+            self.events += len(xs)
+
+        steps = step[np.isfinite(step) & (step >= 0)]
+        if len(steps):
+            buckets = np.bincount(steps.astype(np.int64) // self.bucket)
+            if len(buckets) > len(self.timeline):
+                buckets[:len(self.timeline)] += self.timeline
+                self.timeline = buckets
+            else:
+                self.timeline[:len(buckets)] += buckets
+
+    def hotspots(self, count: int = HOTSPOTS) -> pd.DataFrame:
+        """ The count busiest cells, busiest first. """
+        flat = self.grid.ravel()
+        count = min(count, np.count_nonzero(flat))
+        if count == 0:
+            return pd.DataFrame(columns=["rank", X, Y, "collisions", "share"])
+
+        top = np.argpartition(flat, -count)[-count:]
+        top = top[np.argsort(flat[top])[::-1]]
+        ys, xs = np.unravel_index(top, self.grid.shape)
+        return pd.DataFrame({
+            "rank": np.arange(1, count + 1),
+            X: xs,
+            Y: ys,
+            "collisions": flat[top],
+            "share": flat[top] / self.events
+        })
+
+
+def _readable(path: str) -> bool:
+    try:
+        scripts.metrics.read_header(path)
+        return True
+    except (scripts.metrics.MetricLogException,
+            scripts.archive.ArchiveException):
+        return False
+
+
+def _run_of(f: str, stem: str) -> bool:
+    """ f was written by the run stem, stem2_collision.csv belongs to another run. """
+    return f.startswith(stem) and not f[len(stem):len(stem) + 1].isalnum()
+
+
+def sources(data_dir: str, name: str) -> [str]:
+    """ Every collision table of every run of name, archived ones included.
+
+    A run that has a readable metric log is read from the log alone, its
+    collision csv holds the same events. """
+    files = scripts.archive.listdir(data_dir)
+    logs = [
+        f for f in files if name in f
+        and f.endswith(scripts.metrics.SUFFIX) and _readable(files[f])
+    ]
+    stems = [f[:-len(scripts.metrics.SUFFIX)] for f in logs]
+    csvs = [
+        f for f in files if name in f and COLLISION in f
+        and not f.endswith(scripts.metrics.SUFFIX)
+        and not any([_run_of(f, stem) for stem in stems])
+    ]
+    return sorted([files[f] for f in logs + csvs])
+
+
+def _chunks(path: str, columns: (str, str, str)) -> "iterator":
+    if path.endswith(scripts.metrics.SUFFIX):
+        for chunk in scripts.metrics.chunks(path, CHUNK_ROWS):
+            chunk = chunk[chunk["event"] == scripts.metrics.COLLISION]
+            yield chunk["x"], chunk["y"], chunk["step"].astype(np.float64)
+        return
+
+    x, y, step = columns
+    with scripts.archive.open_file(path) as f:
+        for chunk in pd.read_csv(
+                f, usecols=list(columns), chunksize=CHUNK_ROWS):
+            yield (chunk[x].values.astype(np.float64),
+                   chunk[y].values.astype(np.float64),
+                   chunk[step].values.astype(np.float64))
+
+
+def analyse(logger, name: str, paths: [str],
+            columns: (str, str, str) = COLUMNS) -> heatmap:
+    """ Streams all of paths chunk by chunk, memory stays bounded by CHUNK_ROWS and the grid.
+
+    columns names the x, y and step columns of the csv tables. """
+    result = heatmap(name)
+    for path in paths:
+        try:
+            for x, y, step in _chunks(path, columns):
+                result.add(x, y, step)
+            result.read += 1
+        except (ValueError, pd.errors.EmptyDataError,
+                scripts.metrics.MetricLogException,
+                scripts.archive.ArchiveException) as e:
+            logger.error("Unable to read collisions {} -- REASON: {}".format(
+                path, e))
+
+    if result.dropped:
+        logger.warning("{} -- dropped {} collisions without a position".format(
+            name, result.dropped))
+
+    logger.info("{} -- {} collisions over {} files".format(
+        name, result.events, len(paths)))
+    return result
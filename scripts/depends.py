@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+
+MANIFEST = ".plot-deps.json"
+CHUNK_SIZE = 1 << 20
+
+
+def _digest(path: str) -> str:
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha.update(chunk)
+
+    return sha.hexdigest()
+
+
+class manifest():
+    """ Make-style bookkeeping for the figures in an output directory.
+
+    Every target remembers the mtime, size and content hash of each of its
+    inputs along with the config it was built with. A target is stale when
+    it is missing, the config changed or an input's content changed -- the
+    hash is only recomputed when mtime or size moved, so a plain touch
+    does not trigger a rebuild. """
+
+    def __init__(self, output_dir: str, force: bool = False):
+        self.path = "{}/{}".format(output_dir, MANIFEST)
+        self.force = force
+        self.targets = {}
+        self.dirty = False
+
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path) as f:
+                    self.targets = json.load(f)
+            except (ValueError, OSError):
+                self.targets = {}
+
+    def _fingerprint(self, path: str, previous: dict) -> dict:
+        stat = os.stat(path)
+        fingerprint = {"mtime": stat.st_mtime, "size": stat.st_size}
+        unchanged = previous is not None and all(
+            previous.get(key) == value for key, value in fingerprint.items())
+        if unchanged:
+            fingerprint["hash"] = previous["hash"]
+        else:
+            fingerprint["hash"] = _digest(path)
+
+        return fingerprint
+
+    def stale(self,
+              target: str,
+              inputs: [str],
+              config: dict,
+              outputs: [str] = ()) -> bool:
+        """ outputs are files written along with target, a missing one makes it stale too. """
+        if self.force or not all(
+                os.path.isfile(path) for path in [target] + list(outputs)):
+            return True
+
+        entry = self.targets.get(target)
+        if entry is None or entry["config"] != config:
+            return True
+
+        if sorted(entry["inputs"]) != sorted(inputs):
+            return True
+
+        for path in inputs:
+            if not os.path.isfile(path):
+                return True
+
+            previous = entry["inputs"][path]
+            if self._fingerprint(path, previous)["hash"] != previous["hash"]:
+                return True
+
+        return False
+
+    def update(self,
+               target: str,
+               inputs: [str],
+               config: dict,
+               outputs: [str] = ()) -> None:
+        """ Only targets that actually got written are recorded, everything else stays stale. """
+        if not all(
+                os.path.isfile(path) for path in [target] + list(outputs)):
+            return
+
+        previous = self.targets.get(target, {}).get("inputs", {})
+        self.targets[target] = {
+            "config": config,
+            "inputs": {
+                path: self._fingerprint(path, previous.get(path))
+                for path in inputs
+            }
+        }
+        self.dirty = True
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(self.targets, f, indent=2, sort_keys=True)
+
+        self.dirty = False
@@ -0,0 +1,231 @@
+import json
+import os
+import struct
+import time
+import numpy as np
+import pandas as pd
+import scripts.archive
+
+MAGIC = b"KEXMLOG1"
+VERSION = 1
+SUFFIX = ".metrics"
+""" magic, version, header size, record size, record count. """
+HEADER = struct.Struct("<8sIIIQ")
+COUNT_OFFSET = 20
+PAGE_SIZE = 4096
+DEFAULT_CAPACITY = 1 << 16
+CHUNK_ROWS = 1 << 20
+
+SPAWN = 0
+PICKUP = 1
+DROP = 2
+COLLISION = 3
+EVENTS = {"spawn": SPAWN, "pickup": PICKUP, "drop": DROP, "collision": COLLISION}
+
+RECORD = np.dtype([("step", "<u4"), ("robot", "<i2"), ("event", "<u2"),
+                   ("latency", "<f4"), ("x", "<f4"), ("y", "<f4")])
+
+
+class MetricLogException(Exception):
+    def __init__(self, cause):
+        self.cause = cause
+
+    def __str__(self):
+        return "Metric Log Exception: {}".format(self.cause)
+
+
+def _header(metadata: dict) -> bytes:
+    blob = json.dumps({
+        "schema": RECORD.descr,
+        "events": EVENTS,
+        "metadata": metadata
+    }).encode()
+    size = HEADER.size + 4 + len(blob)
+    """ Pad to a whole page so the records start page aligned. """
+    size = (size + PAGE_SIZE - 1) // PAGE_SIZE * PAGE_SIZE
+    header = HEADER.pack(MAGIC, VERSION, size, RECORD.itemsize,
+                         0) + struct.pack("<I", len(blob)) + blob
+    return header.ljust(size, b"\0")
+
+
+def read_header(path: str) -> (int, int, dict):
+    """ Returns header size, record count and the header json. """
+    with scripts.archive.open_file(path) as f:
+        fixed = f.read(HEADER.size + 4)
+        if len(fixed) < HEADER.size + 4:
+            raise MetricLogException("{} is truncated".format(path))
+
+        magic, version, size, record_size, count = HEADER.unpack(
+            fixed[:HEADER.size])
+        if magic != MAGIC or version != VERSION:
+            raise MetricLogException("{} is not a version {} metric log".format(
+                path, VERSION))
+
+        if record_size != RECORD.itemsize:
+            raise MetricLogException(
+                "{} has {} byte records -- expected {}".format(
+                    path, record_size, RECORD.itemsize))
+
+        length, = struct.unpack("<I", fixed[HEADER.size:])
+        return size, count, json.loads(f.read(length).decode())
+
+
+class metric_log():
+    """ Append-only fixed-width records in a memory-mapped file.
+
+    The record count in the header is bumped after every append, so a run
+    that gets killed still leaves a readable log of everything up to the
+    last record. """
+
+    def __init__(self,
+                 path: str,
+                 metadata: dict = None,
+                 capacity: int = DEFAULT_CAPACITY):
+        metadata = dict(metadata or {})
+        metadata.setdefault("created", time.time())
+        header = _header(metadata)
+
+        self.path = path
+        self.header_size = len(header)
+        self.capacity = capacity
+        self.count = 0
+
+        with open(path, "wb") as f:
+            f.write(header)
+            f.truncate(self.header_size + capacity * RECORD.itemsize)
+
+        self._count = np.memmap(
+            path, dtype="<u8", mode="r+", offset=COUNT_OFFSET, shape=(1, ))
+        self._map()
+
+    def _map(self) -> None:
+        self.records = np.memmap(
+            self.path,
+            dtype=RECORD,
+            mode="r+",
+            offset=self.header_size,
+            shape=(self.capacity, ))
+
+    def _reserve(self, n: int) -> None:
+        if self.count + n <= self.capacity:
+            return
+
+        self.records.flush()
+        del self.records
+        while self.capacity < self.count + n:
+            self.capacity *= 2
+
+        with open(self.path, "r+b") as f:
+            f.truncate(self.header_size + self.capacity * RECORD.itemsize)
+        self._map()
+
+    def append(self,
+               step: int,
+               robot: int,
+               event: int,
+               latency: float = np.nan,
+               x: float = np.nan,
+               y: float = np.nan) -> None:
+        self._reserve(1)
+        self.records[self.count] = (step, robot, event, latency, x, y)
+        self.count += 1
+        self._count[0] = self.count
+
+    def extend(self,
+               step: np.ndarray,
+               robot: np.ndarray,
+               event: np.ndarray,
+               latency: np.ndarray = np.nan,
+               x: np.ndarray = np.nan,
+               y: np.ndarray = np.nan) -> None:
+        """ Vectorized append, scalars are broadcast against the arrays. """
+        columns = np.broadcast_arrays(step, robot, event, latency, x, y)
+        n = columns[0].size
+        if n == 0:
+            return
+
+        self._reserve(n)
+        block = self.records[self.count:self.count + n]
+        for name, column in zip(RECORD.names, columns):
+            block[name] = column.ravel()
+
+        self.count += n
+        self._count[0] = self.count
+
+    def flush(self) -> None:
+        self.records.flush()
+        self._count.flush()
+
+    def close(self) -> None:
+        if self.records is None:
+            return
+
+        self.flush()
+        self.records = None
+        self._count = None
+        with open(self.path, "r+b") as f:
+            f.truncate(self.header_size + self.count * RECORD.itemsize)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read(path: str) -> (np.memmap, dict):
+    """ Zero-copy view of the records, the columns are views too (records["latency"]).
+
+    An archived log is decompressed whole and viewed in place, use chunks
+    to keep memory bounded. """
+    size, count, header = read_header(path)
+    if scripts.archive.SEPARATOR in path:
+        buffer = scripts.archive.read(path)
+        count = min(count, (len(buffer) - size) // RECORD.itemsize)
+        return np.frombuffer(
+            buffer, dtype=RECORD, count=count,
+            offset=size), header["metadata"]
+
+    available = (os.path.getsize(path) - size) // RECORD.itemsize
+    count = min(count, available)
+    if count == 0:
+        return np.zeros(0, dtype=RECORD), header["metadata"]
+
+    return np.memmap(
+        path, dtype=RECORD, mode="r", offset=size,
+        shape=(count, )), header["metadata"]
+
+
+def chunks(path: str, rows: int = CHUNK_ROWS) -> "iterator":
+    """ The records rows at a time, an archived log is only ever decompressed one chunk ahead. """
+    size, count, _ = read_header(path)
+    if scripts.archive.SEPARATOR not in path:
+        records, _ = read(path)
+        for start in range(0, len(records), rows):
+            yield records[start:start + rows]
+        return
+
+    with scripts.archive.open_file(path) as f:
+        f.read(size)
+        while count > 0:
+            data = f.read(min(rows, count) * RECORD.itemsize)
+            n = len(data) // RECORD.itemsize
+            if n == 0:
+                return
+
+            count -= n
+            yield np.frombuffer(data, dtype=RECORD, count=n)
+
+
+def frame(path: str, event: int) -> pd.DataFrame:
+    """ Only the records of event are kept, the log is streamed through. """
+    selected = [chunk[chunk["event"] == event] for chunk in chunks(path)]
+    selected = np.concatenate(selected) if selected else np.zeros(
+        0, dtype=RECORD)
+    return pd.DataFrame({
+        "step": selected["step"],
+        "robot": selected["robot"],
+        "latency": selected["latency"],
+        "x": selected["x"],
+        "y": selected["y"]
+    })
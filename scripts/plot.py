@@ -1,10 +1,17 @@
 import configparser
 import os
 import sys
+import time
 import pandas as pd
 import numpy as np
 import seaborn as sb
 import matplotlib.pyplot as plt
+import matplotlib.collections
+import matplotlib.lines
+import scripts.archive
+import scripts.collisions
+import scripts.depends
+import scripts.metrics
 
 LATENCY = "latency"
 COLLISION = "collision"
@@ -12,15 +19,71 @@ THROUGHPUT = "throughput"
 SIMULATION = "simulation"
 EFFICIENCY = "efficiency"
 
+""" Types that can be read out of a binary metric log instead of a csv. """
+METRIC_EVENTS = {
+    LATENCY: scripts.metrics.DROP,
+    COLLISION: scripts.metrics.COLLISION
+}
+
+GROUP_OUTPUTS = {
+    LATENCY: "latencies",
+    THROUGHPUT: "throughputs",
+    COLLISION: "collisions",
+    EFFICIENCY: "efficiencies"
+}
+""" Sections of the config that change what a figure looks like. """
+DEPENDENCY_SECTIONS = ["names", "meta", "output", COLLISION]
+
+OUTPUT_FORMATS = ["pdf", "png", "svg"]
+DEFAULT_FORMAT = "pdf"
+DEFAULT_DPI = 150
+""" Lines / collections with more points than this are rasterized, 0 disables. """
+DEFAULT_RASTERIZE = 10000
+""" Reduce lines with more points than pixels to their per-pixel min / max envelope. """
+DEFAULT_DECIMATE = True
+
+
+class _output_config():
+    def __init__(self,
+                 output_dir: str,
+                 format: str,
+                 dpi: int,
+                 rasterize: int,
+                 decimate: bool = DEFAULT_DECIMATE):
+        self.output_dir = output_dir
+        self.format = format
+        self.dpi = dpi
+        self.rasterize = rasterize
+        self.decimate = decimate
+
+    def path(self, name: str) -> str:
+        return "{}/{}.{}".format(self.output_dir, name, self.format)
+
+    def __str__(self):
+        return self.output_dir
+
 
 class _plot_config():
-    def __init__(self, names: [str], types: [int], merge: bool, data_dir: str,
-                 output_dir: "str"):
+    def __init__(self,
+                 names: [str],
+                 types: [int],
+                 merge: bool,
+                 data_dir: str,
+                 output_dir: "str",
+                 sections: dict = None,
+                 force: bool = False,
+                 output: _output_config = None,
+                 columns: (str, str, str) = scripts.collisions.COLUMNS):
         self.names = names
         self.types = types
         self.merge = merge
         self.data_dir = data_dir
         self.output_dir = output_dir
+        self.sections = sections if sections is not None else {}
+        self.deps = scripts.depends.manifest(output_dir, force)
+        self.output = output if output is not None else _output_config(
+            output_dir, DEFAULT_FORMAT, DEFAULT_DPI, DEFAULT_RASTERIZE)
+        self.columns = columns
 
     def __str__(self):
         return "{} {} {} {}".format(self.names, self.types, self.merge,
@@ -28,17 +91,31 @@ class _plot_config():
 
 
 class _data():
-    def __init__(self, name: str, type: str, data: pd.DataFrame):
+    """ Parsed on first access so figures that are up to date never read their csv / metric log. """
+
+    def __init__(self, name: str, type: str, path: str):
         self.name = name
         self.type = type
-        self.data = data
+        self.path = path
+        self._data = None
+
+    @property
+    def data(self) -> pd.DataFrame:
+        if self._data is None:
+            if self.path.endswith(scripts.metrics.SUFFIX):
+                self._data = scripts.metrics.frame(self.path,
+                                                   METRIC_EVENTS[self.type])
+            else:
+                with scripts.archive.open_file(self.path) as f:
+                    self._data = pd.read_csv(f)
+        return self._data
 
 
 def _interactive(logger):
     print("interactive Plot")
 
 
-def plot(logger):
+def plot(logger, force: bool = False):
     dirr = os.listdir(".")
 
     config_files = [f for f in os.listdir(".") if ".conf" in f]
@@ -96,7 +173,39 @@ def plot(logger):
     data_dir = config["meta"]["data_dir"]
     output_dir = config["meta"]["output_dir"]
 
-    _plot(logger, _plot_config(names, types, merge, data_dir, output_dir))
+    output = _output_config(output_dir, DEFAULT_FORMAT, DEFAULT_DPI,
+                            DEFAULT_RASTERIZE)
+    if "output" in config:
+        try:
+            output.format = config["output"].get("format",
+                                                 DEFAULT_FORMAT).lower()
+            output.dpi = config["output"].getint("dpi", DEFAULT_DPI)
+            output.rasterize = config["output"].getint(
+                "rasterize", DEFAULT_RASTERIZE)
+            output.decimate = config["output"].getboolean(
+                "decimate", DEFAULT_DECIMATE)
+        except ValueError as e:
+            logger.error("section output is malformed -- {}".format(e))
+            return
+
+    if output.format not in OUTPUT_FORMATS:
+        logger.error("Unknown output format {} -- expected one of {}".format(
+            output.format, " ".join(OUTPUT_FORMATS)))
+        return
+
+    """ Column names of the collision csvs, x / y / step unless mapped. """
+    columns = scripts.collisions.COLUMNS
+    if COLLISION in config:
+        columns = tuple(config[COLLISION].get(key, key) for key in columns)
+
+    sections = {
+        section: dict(config[section])
+        for section in DEPENDENCY_SECTIONS if section in config
+    }
+
+    _plot(logger,
+          _plot_config(names, types, merge, data_dir, output_dir, sections,
+                       force, output, columns))
 
 
 def _get_data(logger, data_dir: str, names: [str], types: [str]) -> [_data]:
@@ -104,17 +213,32 @@ def _get_data(logger, data_dir: str, names: [str], types: [str]) -> [_data]:
         logger.error("{} is not a directory".format(data_dir))
         return
 
-    files = os.listdir(data_dir)
+    """ Runs that were archived are read straight out of their archive. """
+    files = scripts.archive.listdir(data_dir, logger)
 
     datas = []
     for name in names:
         nfiles = [f for f in files if name in f]
+        metrics = "{}{}".format(name, scripts.metrics.SUFFIX)
         """ Get specified types """
         for t in types:
             """ Efficiency is a special case. """
             if t == EFFICIENCY:
                 t = SIMULATION
 
+            """ Prefer the binary metric log, it is mapped instead of parsed. """
+            if t in METRIC_EVENTS and metrics in files:
+                path = files[metrics]
+                try:
+                    scripts.metrics.read_header(path)
+                    datas.append(_data(name, t, path))
+                    continue
+                except (scripts.metrics.MetricLogException,
+                        scripts.archive.ArchiveException, OSError) as e:
+                    logger.error(
+                        "Unable to read {} -- REASON: {} -- Trying csv".format(
+                            path, e))
+
             file = None
             for f in nfiles:
                 if t in f:
@@ -122,10 +246,14 @@ def _get_data(logger, data_dir: str, names: [str], types: [str]) -> [_data]:
                     break
 
             if file != None:
+                path = files[file]
                 try:
-                    csv = pd.read_csv("{}/{}".format(data_dir, file))
-                    datas.append(_data(name, t, csv))
-                except pd.errors.EmptyDataError as e:
+                    """ Only the header -- the rest is read if the figure needs rebuilding. """
+                    with scripts.archive.open_file(path) as f:
+                        pd.read_csv(f, nrows=0)
+                    datas.append(_data(name, t, path))
+                except (pd.errors.EmptyDataError,
+                        scripts.archive.ArchiveException, OSError) as e:
                     logger.error("Unable to parse {}/{} -- REASON: {}".format(
                         data_dir, file, e))
 
@@ -137,11 +265,75 @@ def _get_data(logger, data_dir: str, names: [str], types: [str]) -> [_data]:
     return datas
 
 
+def _modules(data: _data) -> [str]:
+    """ The code that reads and analyses data, a change to any of it changes the figure. """
+    modules = [__file__]
+    if data.type == COLLISION:
+        modules.append(scripts.collisions.__file__)
+    if data.path.endswith(scripts.metrics.SUFFIX):
+        modules.append(scripts.metrics.__file__)
+    if scripts.archive.SEPARATOR in data.path:
+        modules.append(scripts.archive.__file__)
+    return modules
+
+
+def _inputs(datas: [_data]) -> [str]:
+    """ Archived data is tracked through the archive that holds it. """
+    inputs = set([__file__])
+    for d in datas:
+        inputs.add(scripts.archive.container(d.path))
+        inputs.update(_modules(d))
+    return sorted(inputs)
+
+
+def _up_to_date(logger,
+                config: _plot_config,
+                target: str,
+                datas: [_data],
+                outputs: [str] = ()) -> bool:
+    inputs = _inputs(datas)
+    if config.deps.stale(target, inputs, config.sections, outputs):
+        return False
+
+    logger.info("{} is up to date -- skipping".format(target))
+    return True
+
+
+def _built(config: _plot_config,
+           target: str,
+           datas: [_data],
+           outputs: [str] = ()) -> None:
+    """ Saved right away so the figures built so far stay recorded if a later one fails. """
+    inputs = _inputs(datas)
+    config.deps.update(target, inputs, config.sections, outputs)
+    config.deps.save()
+
+
+def _collision_sources(config: _plot_config, names: [str]) -> [_data]:
+    """ Collisions are aggregated over every run, not just the first file found. """
+    return [
+        _data(name, COLLISION, path) for name in names
+        for path in scripts.collisions.sources(config.data_dir, name)
+    ]
+
+
+def _by_name(config: _plot_config, datas: [_data]) -> [_data]:
+    """ Still unparsed, only plots that draw something read their data. """
+    return sorted(datas, key=lambda x: config.names.index(x.name))
+
+
+def _hotspots(output: _output_config, figure: str) -> str:
+    return "{}/{}_hotspots.csv".format(output.output_dir, figure)
+
+
 def _plot(logger, config: _plot_config) -> None:
     datas = _get_data(logger, config.data_dir, config.names, config.types)
+    if datas is None:
+        return
 
     if config.merge:
         for t in config.types:
+            target = config.output.path(GROUP_OUTPUTS.get(t, t))
             """ Efficiency is a special case since it needs several data sources. """
             if t == EFFICIENCY:
                 throughputs = [
@@ -154,38 +346,31 @@ def _plot(logger, config: _plot_config) -> None:
 
                 if len(throughputs) == len(latencies) == len(
                         simulation) == len(config.names):
-                    latencies = list(
-                        map(lambda d: d.data,
-                            sorted(
-                                latencies,
-                                key=lambda x: config.names.index(x.name))))
-                    throughputs = list(
-                        map(lambda d: d.data,
-                            sorted(
-                                throughputs,
-                                key=lambda x: config.names.index(x.name))))
-                    simulation = list(
-                        map(lambda d: d.data,
-                            sorted(
-                                simulation,
-                                key=lambda x: config.names.index(x.name))))
-                    _plot_efficiency_group(logger, config.names,
-                                           zip(throughputs, latencies,
-                                               simulation), config.output_dir)
+                    sources = throughputs + latencies + simulation
+                    if _up_to_date(logger, config, target, sources):
+                        continue
+
+                    _plot_efficiency_group(
+                        logger, config.names,
+                        zip(
+                            _by_name(config, throughputs),
+                            _by_name(config, latencies),
+                            _by_name(config, simulation)), config.output)
+                    _built(config, target, sources)
                 else:
                     logger.error(
                         "Failed to plot efficiency group for {} because data were missing".
                         format(" ".join(config.names)))
             elif t == LATENCY:
                 latencies = [data for data in datas if data.type == LATENCY]
-                if len(throughputs) == len(config.names):
-                    latencies = list(
-                        map(lambda d: d.data,
-                            sorted(
-                                latencies,
-                                key=lambda x: config.names.index(x.name))))
-                    _plot_latency_group(logger, config.names, latencies,
-                                        config.output_dir)
+                if len(latencies) == len(config.names):
+                    if _up_to_date(logger, config, target, latencies):
+                        continue
+
+                    _plot_latency_group(logger, config.names,
+                                        _by_name(config, latencies),
+                                        config.output)
+                    _built(config, target, latencies)
                 else:
                     logger.error("Missing data for latency group plot")
             elif t == THROUGHPUT:
@@ -193,39 +378,58 @@ def _plot(logger, config: _plot_config) -> None:
                     data for data in datas if data.type == THROUGHPUT
                 ]
                 if len(throughputs) == len(config.names):
-                    throughputs = list(
-                        map(lambda d: d.data,
-                            sorted(
-                                throughputs,
-                                key=lambda x: config.names.index(x.name))))
-                    _plot_throughput_group(logger, config.names, throughputs,
-                                           config.output_dir)
+                    if _up_to_date(logger, config, target, throughputs):
+                        continue
+
+                    _plot_throughput_group(logger, config.names,
+                                           _by_name(config, throughputs),
+                                           config.output)
+                    _built(config, target, throughputs)
                 else:
                     logger.error("Missing data for throughputs group plot")
             elif t == COLLISION:
-                collisions = [data for data in datas if data.type == COLLISION]
-                if len(collisions) == len(config.names):
-                    collisions = list(
-                        map(lambda d: d.data,
-                            sorted(
-                                collisions,
-                                key=lambda x: config.names.index(x.name))))
-                    _plot_collisions(logger, config.names, collisions,
-                                     config.output_dir)
+                collisions = _collision_sources(config, config.names)
+                hotspots = [_hotspots(config.output, GROUP_OUTPUTS[t])]
+                if len(set([d.name for d in collisions])) == len(config.names):
+                    if _up_to_date(logger, config, target, collisions,
+                                   hotspots):
+                        continue
+
+                    if _plot_collisions_group(logger, config.names, [[
+                            d.path for d in collisions if d.name == name
+                    ] for name in config.names], config.output,
+                                              config.columns):
+                        _built(config, target, collisions, hotspots)
                 else:
                     logger.error("Missing data for collisions group plot")
             else:
                 logger.error("Unknown plotting type {}".format(t))
     else:
         for d in datas:
+            target = config.output.path("{}_{}".format(d.name, d.type))
             if d.type == LATENCY:
-                _plot_latency(logger, d.name, d.data, config.output_dir)
+                if not _up_to_date(logger, config, target, [d]):
+                    _plot_latency(logger, d.name, d, config.output)
+                    _built(config, target, [d])
             elif d.type == THROUGHPUT:
-                _plot_throughput(logger, d.name, d.data, config.output_dir)
+                if not _up_to_date(logger, config, target, [d]):
+                    _plot_throughput(logger, d.name, d, config.output)
+                    _built(config, target, [d])
             elif d.type == COLLISION:
-                _plot_collisions(logger, d.name, d.data, config.output_dir)
+                collisions = _collision_sources(config, [d.name])
+                hotspots = [
+                    _hotspots(config.output, "{}_{}".format(d.name, d.type))
+                ]
+                if not _up_to_date(logger, config, target, collisions,
+                                   hotspots):
+                    if _plot_collisions(logger, d.name,
+                                        [c.path for c in collisions],
+                                        config.output, config.columns):
+                        _built(config, target, collisions, hotspots)
             elif d.type == SIMULATION:
                 """ Need throughput & latency datas too """
+                target = config.output.path("{}_{}".format(
+                    d.name, EFFICIENCY))
                 throughput = [
                     data for data in datas
                     if data.type == THROUGHPUT and data.name == d.name
@@ -236,10 +440,13 @@ def _plot(logger, config: _plot_config) -> None:
                 ]
 
                 if len(throughput) == len(latency) == 1:
-                    _plot_efficiency(
-                        logger, d.name,
-                        (throughput[0].data, latency[0].data, d.data),
-                        config.output_dir)
+                    sources = throughput + latency + [d]
+                    if not _up_to_date(logger, config, target, sources):
+                        _plot_efficiency(
+                            logger, d.name,
+                            (throughput[0], latency[0], d),
+                            config.output)
+                        _built(config, target, sources)
                 else:
                     logger.error(
                         "Missing data for efficiency plot of {}".format(
@@ -248,40 +455,123 @@ def _plot(logger, config: _plot_config) -> None:
                 logger.error("Unknown plotting type {}".format(d.type))
 
 
+def _points(artist) -> int:
+    if isinstance(artist, matplotlib.lines.Line2D):
+        return len(artist.get_xdata())
+    if isinstance(artist, matplotlib.collections.PathCollection):
+        return len(artist.get_offsets())
+    if isinstance(artist, matplotlib.collections.Collection):
+        return sum(len(path.vertices) for path in artist.get_paths())
+    return 0
+
+
+def _envelope(x: np.ndarray, y: np.ndarray, bins: int) -> (np.ndarray,
+                                                            np.ndarray):
+    """ Min and max of y per x bin, in that order -- what is left once a bin is a single pixel wide. """
+    edges = np.linspace(x[0], x[-1], bins + 1)
+    index = np.clip(np.searchsorted(edges, x, side="right") - 1, 0, bins - 1)
+    starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+
+    xs = np.repeat(x[starts], 2)
+    ys = np.empty(len(xs))
+    ys[0::2] = np.fmin.reduceat(y, starts)
+    ys[1::2] = np.fmax.reduceat(y, starts)
+    return xs, ys
+
+
+def _decimate(fig, dpi: int) -> int:
+    """ Dense lines over a sorted x (time series) are replaced by their envelope
+    at the output resolution, which bounds their cost by the width of the axes
+    instead of the length of the run. """
+    decimated = 0
+    for ax in fig.get_axes():
+        pixels = int(ax.get_window_extent().width * dpi / fig.dpi)
+        for line in ax.lines:
+            x = np.asarray(line.get_xdata(), dtype=np.float64)
+            y = np.asarray(line.get_ydata(), dtype=np.float64)
+            if pixels < 1 or len(x) <= 2 * pixels or len(x) != len(y):
+                continue
+            if not np.all(np.diff(x) >= 0):
+                continue
+
+            line.set_data(*_envelope(x, y, pixels))
+            decimated += 1
+
+    return decimated
+
+
+def _rasterize(fig, threshold: int) -> int:
+    """ Dense lines / scatters become a single image, axes, text and sparse artists stay vector. """
+    rasterized = 0
+    for ax in fig.get_axes():
+        for artist in ax.lines + ax.collections:
+            if _points(artist) > threshold:
+                artist.set_rasterized(True)
+                rasterized += 1
+
+    return rasterized
+
+
+def _save(logger, fig, output: _output_config, name: str) -> str:
+    path = output.path(name)
+    timestamp = time.time()
+
+    decimated = 0
+    if output.decimate:
+        decimated = _decimate(fig, output.dpi)
+
+    rasterized = 0
+    if output.format != "png" and output.rasterize > 0:
+        rasterized = _rasterize(fig, output.rasterize)
+
+    fig.savefig(
+        path, format=output.format, dpi=output.dpi, bbox_inches='tight')
+
+    logger.info(
+        "Saved {} -- {:.1f} KiB -- {} decimated / {} rasterized artists -- {:.2f} seconds".
+        format(path,
+               os.path.getsize(path) / 1024, decimated, rasterized,
+               time.time() - timestamp))
+    return path
+
+
 """ These are simple plots we will have to think abit about how we want to plot it later. """
 
 
-def _plot_latency(logger, name: str, latency: pd.DataFrame,
-                  output_dir: str) -> None:
-    logger.info("Plotting latency {} -- output {}".format(name, output_dir))
+def _plot_latency(logger, name: str, latency: _data,
+                  output: _output_config) -> None:
+    logger.info("Plotting latency {} -- output {}".format(name, output))
 
 
-def _plot_throughput(logger, name: str, throughput: pd.DataFrame,
-                     output_dir: str) -> None:
-    logger.info("Plotting throughput {} -- output {}".format(name, output_dir))
+def _plot_throughput(logger, name: str, throughput: _data,
+                     output: _output_config) -> None:
+    logger.info("Plotting throughput {} -- output {}".format(name, output))
 
 
-def _plot_collisions(logger, name: str, collisions: pd.DataFrame,
-                     output_dir: str) -> None:
-    logger.info("Plotting collisions {} -- output {}".format(name, output_dir))
+def _plot_collisions(logger, name: str, collisions: [str],
+                     output: _output_config,
+                     columns: (str, str, str)) -> bool:
+    logger.info("Plotting collisions {} -- output {}".format(name, output))
+    return _plot_collisions_group(logger, [name], [collisions], output,
+                                  columns, "{}_{}".format(name, COLLISION))
 
 
 def _plot_efficiency(logger, name: str,
-                     efficiency: (pd.DataFrame, pd.DataFrame,
-                                  pd.DataFrame), output_dir: str) -> None:
-    logger.info("Plotting efficiency {} -- output {}".format(name, output_dir))
+                     efficiency: (_data, _data, _data),
+                     output: _output_config) -> None:
+    logger.info("Plotting efficiency {} -- output {}".format(name, output))
 
 
-def _plot_latency_group(logger, names: [str], latencies: [pd.DataFrame],
-                        output_dir: str) -> None:
+def _plot_latency_group(logger, names: [str], latencies: [_data],
+                        output: _output_config) -> None:
     logger.info("Plotting latency group {} -- output {}".format(
-        " ".join(names), output_dir))
+        " ".join(names), output))
 
     fig, (drops, slowest, average) = plt.subplots(3, figsize=(20, 10))
 
     maxes = []
     averages = []
-    for i, latency in enumerate(latencies):
+    for i, latency in enumerate([l.data for l in latencies]):
         sb.lineplot(range(len(latency["latency"])), 
                 y="latency", data=latency, ax=drops, label=names[i])
         drops.legend()
@@ -294,24 +584,69 @@ def _plot_latency_group(logger, names: [str], latencies: [pd.DataFrame],
     sb.barplot(x=names, y=maxes, ax=slowest)
     sb.barplot(x=names, y=averages, ax=average)
 
-    fig.savefig("{}/latencies.pdf".format(output_dir), bbox_inches='tight')
+    _save(logger, fig, output, GROUP_OUTPUTS[LATENCY])
 
 
-def _plot_throughput_group(logger, names: [str], throughputs: [pd.DataFrame],
-                           output_dir: str) -> None:
+def _plot_throughput_group(logger, names: [str], throughputs: [_data],
+                           output: _output_config) -> None:
     logger.info("Plotting throughput group {} -- output {}".format(
-        " ".join(names), output_dir))
-
-
-def _plot_collisions_group(logger, names: [str], collisions: [pd.DataFrame],
-                           output_dir: str) -> None:
+        " ".join(names), output))
+
+
+def _plot_collisions_group(logger,
+                           names: [str],
+                           collisions: [[str]],
+                           output: _output_config,
+                           columns: (str, str,
+                                     str) = scripts.collisions.COLUMNS,
+                           figure: str = GROUP_OUTPUTS[COLLISION]) -> bool:
+    """ Nothing is saved when every source of a name failed to read, an
+    empty heatmap would pass for a run without collisions. """
     logger.info("Plotting collisions group {} -- output {}".format(
-        " ".join(names), output_dir))
+        " ".join(names), output))
+
+    heatmaps = [
+        scripts.collisions.analyse(logger, name, paths, columns)
+        for name, paths in zip(names, collisions)
+    ]
+    unread = [heatmap.name for heatmap in heatmaps if heatmap.read == 0]
+    if unread:
+        logger.error("No collisions could be read for {} -- not saving {}".
+                     format(" ".join(unread), figure))
+        return False
+
+    fig, axes = plt.subplots(
+        2, len(names), figsize=(6 * len(names), 10), squeeze=False)
+
+    hotspots = []
+    for i, heatmap in enumerate(heatmaps):
+        space, timeline = axes[0][i], axes[1][i]
+        image = space.imshow(heatmap.grid, origin="lower", cmap="magma")
+        fig.colorbar(image, ax=space)
+        space.set_title("{} -- {} collisions".format(heatmap.name,
+                                                   heatmap.events))
+
+        timeline.bar(
+            np.arange(len(heatmap.timeline)) * heatmap.bucket,
+            heatmap.timeline,
+            width=heatmap.bucket)
+        timeline.set_xlabel("step")
+
+        ranking = heatmap.hotspots()
+        ranking.insert(0, "name", heatmap.name)
+        hotspots.append(ranking)
+        for _, spot in ranking.iterrows():
+            logger.info("{} hotspot {} at ({}, {}) -- {} collisions".format(
+                heatmap.name, spot["rank"], spot["x"], spot["y"],
+                spot["collisions"]))
+
+    pd.concat(hotspots).to_csv(_hotspots(output, figure), index=False)
+    _save(logger, fig, output, figure)
+    return True
 
 
 def _plot_efficiency_group(logger, names: [str],
-                           efficiencies: [(pd.DataFrame, pd.DataFrame,
-                                           pd.DataFrame)],
-                           output_dir: str) -> None:
+                           efficiencies: [(_data, _data, _data)],
+                           output: _output_config) -> None:
     logger.info("Plotting efficiency group {} -- output {}".format(
-        " ".join(names), output_dir))
+        " ".join(names), output))
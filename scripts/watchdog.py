@@ -0,0 +1,260 @@
+import multiprocessing
+import os
+import resource
+import signal
+import sys
+import time
+import traceback
+
+OK = "ok"
+ERROR = "error"
+TIMEOUT = "timeout"
+STALLED = "stalled"
+CPU = "cpu"
+MEMORY = "memory"
+UNSTABLE = "unstable"
+
+POLL_INTERVAL = 0.5
+CHECK_INTERVAL = 5.0
+TERMINATE_GRACE = 5.0
+RECORD_FILE = "watchdog.csv"
+""" Longest failure reason sent back, the exception line gets at most half of it. """
+MAX_REASON = 4096
+
+
+class limits():
+    """ Zero (or None) disables a limit. wall / cpu / stall are in seconds, memory in bytes. """
+
+    def __init__(self, wall: float, cpu: int, memory: int, stall: float):
+        self.wall = wall
+        self.cpu = cpu
+        self.memory = memory
+        self.stall = stall
+
+    def __str__(self):
+        return "wall {} cpu {} memory {} stall {}".format(
+            self.wall, self.cpu, self.memory, self.stall)
+
+
+class result():
+    def __init__(self, name: str, status: str, reason: str, duration: float):
+        self.name = name
+        self.status = status
+        self.reason = reason
+        self.duration = duration
+
+    @property
+    def failed(self) -> bool:
+        return self.status != OK
+
+    def __str__(self):
+        return "{} {} {:.1f}s -- {}".format(self.name, self.status,
+                                            self.duration, self.reason)
+
+
+def _apply_rlimits(limit: limits) -> None:
+    if limit.cpu:
+        """ Soft limit raises SIGXCPU, hard limit a little later is SIGKILL. """
+        resource.setrlimit(resource.RLIMIT_CPU,
+                           (int(limit.cpu), int(limit.cpu) + 5))
+    if limit.memory:
+        """ Linux ignores RLIMIT_RSS. RLIMIT_DATA caps the heap and private
+        mappings, an allocation past it fails with MemoryError right away
+        instead of overshooting until the next RSS poll. """
+        resource.setrlimit(resource.RLIMIT_DATA, (limit.memory, limit.memory))
+
+
+def _cpu(pid: int) -> int:
+    """ utime + stime of the child and its waited-for children, in clock ticks. """
+    try:
+        with open("/proc/{}/stat".format(pid)) as stat:
+            """ The command name may contain spaces, the fields start after its closing paren. """
+            fields = stat.read().rsplit(")", 1)[1].split()
+            return sum([int(field) for field in fields[11:15]])
+    except (FileNotFoundError, ProcessLookupError, IndexError, ValueError):
+        return 0
+
+
+def _output(directory: str) -> (int, float):
+    """ Total size and newest mtime of the files in directory. """
+    size, mtime = 0, 0.0
+    if directory is None or not os.path.isdir(directory):
+        return size, mtime
+
+    for f in os.listdir(directory):
+        try:
+            stat = os.stat("{}/{}".format(directory, f))
+        except FileNotFoundError:
+            continue
+        size += stat.st_size
+        mtime = max(mtime, stat.st_mtime)
+
+    return size, mtime
+
+
+def _progress(pid: int, output: str) -> tuple:
+    """ Changes whenever the child burns CPU or writes output -- a child that
+    is blocked or deadlocked does neither, a busy one does at least one. """
+    return (_cpu(pid), ) + _output(output)
+
+
+def _terminate(signum, frame):
+    """ Unwind through finally / atexit so whatever data was collected is flushed. """
+    raise SystemExit("Terminated by watchdog")
+
+
+def _reason() -> str:
+    """ The exception line first, then as much of the end of the stack as fits. """
+    kind, value, trace = sys.exc_info()
+    exception = "".join(traceback.format_exception_only(
+        kind, value))[:MAX_REASON // 2]
+    stack = "".join(traceback.format_tb(trace))
+    return exception + stack[max(0, len(stack) - MAX_REASON + len(exception)):]
+
+
+def _child(target: "f: eval", args: tuple, limit: limits,
+           connection) -> None:
+    signal.signal(signal.SIGTERM, _terminate)
+    _apply_rlimits(limit)
+
+    try:
+        target(*args)
+    except MemoryError:
+        connection.send((MEMORY, _reason()))
+    except BaseException:
+        connection.send((ERROR, _reason()))
+    else:
+        connection.send((OK, ""))
+
+
+def _rss(pid: int) -> int:
+    try:
+        with open("/proc/{}/statm".format(pid)) as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except (FileNotFoundError, ProcessLookupError, IndexError, ValueError):
+        return 0
+
+
+def _receive(receiver, message: tuple) -> tuple:
+    try:
+        if message is None and receiver.poll():
+            return receiver.recv()
+    except (EOFError, OSError):
+        pass
+    return message
+
+
+def _children_cpu() -> float:
+    """ CPU seconds used by every child this process has waited for. """
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _kill(process: multiprocessing.Process) -> None:
+    process.terminate()
+    process.join(TERMINATE_GRACE)
+    if process.is_alive():
+        process.kill()
+        process.join()
+
+
+def supervise(logger,
+              name: str,
+              target: "f: eval",
+              args: tuple,
+              limit: limits,
+              check: "f: () -> str" = None,
+              output: str = None) -> result:
+    """ Run target(*args) in a child process and kill it if it breaks any of the limits.
+
+    The child is a fresh interpreter, target and args have to pickle. It
+    inherits none of the parent's atexit handlers and runs its own on the
+    way out. The run counts as stalled once it has neither used CPU nor changed a
+    file in output for limit.stall seconds. check is polled every
+    CHECK_INTERVAL seconds, a non-empty return is the reason to stop the
+    run early. """
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_child, args=(target, args, limit, sender))
+
+    logger.info("Supervising {} -- {}".format(name, limit))
+    timestamp = time.time()
+    cpu = _children_cpu()
+    process.start()
+    sender.close()
+
+    status, reason = None, ""
+    message = None
+    checked = timestamp
+    progress, progressed = None, timestamp
+    while process.is_alive():
+        process.join(POLL_INTERVAL)
+        now = time.time()
+
+        if limit.stall:
+            current = _progress(process.pid, output)
+            if current != progress:
+                progress, progressed = current, now
+
+        """ Drain as we go, a child blocked in send never exits. """
+        message = _receive(receiver, message)
+
+        if limit.wall and now - timestamp > limit.wall:
+            status, reason = TIMEOUT, "Exceeded {} seconds wall-clock".format(
+                limit.wall)
+        elif limit.stall and now - progressed > limit.stall:
+            status, reason = STALLED, "No progress for {} seconds".format(
+                limit.stall)
+        elif limit.memory and _rss(process.pid) > limit.memory:
+            status, reason = MEMORY, "RSS exceeded {} bytes".format(
+                limit.memory)
+        elif check is not None and now - checked > CHECK_INTERVAL:
+            checked = now
+            reason = check()
+            if reason:
+                status = UNSTABLE
+
+        if status is not None:
+            _kill(process)
+            break
+
+    message = _receive(receiver, message)
+    if status is None and message is not None:
+        status, reason = message
+
+    if status is None:
+        """ Past the soft limit the hard one follows with SIGKILL. """
+        if process.exitcode == -signal.SIGXCPU or (
+                process.exitcode == -signal.SIGKILL and limit.cpu
+                and _children_cpu() - cpu >= limit.cpu):
+            status, reason = CPU, "Exceeded {} seconds CPU time".format(
+                limit.cpu)
+        else:
+            status, reason = ERROR, "Exited with code {}".format(
+                process.exitcode)
+
+    receiver.close()
+    outcome = result(name, status, reason, time.time() - timestamp)
+    if outcome.failed:
+        logger.error("Evaluation failed {}".format(outcome))
+    else:
+        logger.info("Duration {} seconds".format(outcome.duration))
+
+    return outcome
+
+
+def record(data_dir: str, outcome: result) -> None:
+    """ Failed runs keep whatever partial data they wrote, this says which ones they were. """
+    if not os.path.isdir(data_dir):
+        os.mkdir(data_dir)
+
+    path = "{}/{}".format(data_dir, RECORD_FILE)
+    exists = os.path.isfile(path)
+    with open(path, "a") as f:
+        if not exists:
+            f.write("timestamp,name,status,duration,reason\n")
+        f.write("{},{},{},{:.3f},\"{}\"\n".format(
+            time.time(), outcome.name, outcome.status, outcome.duration,
+            outcome.reason.strip().splitlines()[0].replace("\"", "'")
+            if outcome.reason else ""))